@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialización de la API de Credicálidda
+Compara bytes enviados y CPU por petición: jsonify (antes) vs api_serializer (después)
+No necesita Flask: reproduce el cuerpo que generaba jsonify en modo producción
+"""
+
+import argparse
+import copy
+import json
+import time
+
+from api_serializer import JSON_BACKEND, CompressedResponseCache, EncodedProductCache, compress, dumps
+
+
+def load_items(catalog_path, scale):
+    """Cargar productos del catálogo, replicados `scale` veces"""
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        items = json.load(f).get('items', [])
+    result = []
+    for i in range(scale):
+        for item in items:
+            clone = copy.deepcopy(item)
+            clone['slug'] = f"{item.get('slug', '')}-{i}"
+            result.append(clone)
+    return result
+
+
+PAGE_SIZE = 20
+
+
+def envelope(products, total):
+    """Respuesta de /api/products con la misma forma que el servidor"""
+    return {
+        'success': True,
+        'data': {
+            'products': products,
+            'pagination': {'page': 1, 'per_page': total, 'total': total, 'pages': 1},
+            'filters': {}
+        }
+    }
+
+
+def detail_envelope(product):
+    """Respuesta de /api/products/<slug> con la misma forma que el servidor"""
+    return {'success': True, 'data': product}
+
+
+def jsonify_body(payload):
+    """Cuerpo equivalente a flask.jsonify con DEBUG=False (ascii, sort_keys, compacto)"""
+    return (json.dumps(payload, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def timed(func, iterations):
+    """CPU promedio por llamada en microsegundos"""
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def run_case(name, before_payload, after_payload, iterations):
+    """
+    Medir una respuesta.
+    antes = jsonify; json = api_serializer sin comprimir; comp. = api_serializer + gzip/br;
+    caché = respuesta comprimida servida desde CompressedResponseCache ya caliente (misma versión y URL)
+    """
+    before_body = jsonify_body(before_payload())
+
+    def serialize():
+        return dumps(after_payload())
+
+    def serialize_and_compress():
+        return compress(serialize(), 'gzip, deflate, br')
+
+    response_cache = CompressedResponseCache()
+
+    def cached():
+        entry = response_cache.get(1, name)
+        if entry is None:
+            entry = serialize_and_compress()
+            response_cache.put(1, name, entry)
+        return entry
+
+    after_body, encoding = serialize_and_compress()
+    cached()  # El primer fallo de caché no cuenta como acierto
+    before_us = timed(lambda: jsonify_body(before_payload()), iterations)
+    serialize_us = timed(serialize, iterations)
+    total_us = timed(serialize_and_compress, iterations)
+    cached_us = timed(cached, iterations)
+
+    print(f"{name:<26} {len(before_body):>10} {len(serialize()):>10} {len(after_body):>10} {encoding or '-':>6} "
+          f"{before_us:>10.1f} {serialize_us:>10.1f} {total_us:>10.1f} {cached_us:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de respuestas /api/*')
+    parser.add_argument('--catalog', default='data/catalogo.json')
+    parser.add_argument('--scale', type=int, default=1, help='Replicar el catálogo N veces')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    items = load_items(args.catalog, args.scale)
+    cache = EncodedProductCache()
+    cache.rebuild(items, 1)
+
+    print(f"Backend JSON: {JSON_BACKEND} | productos: {len(items)} | iteraciones: {args.iterations}")
+    print(f"{'caso':<26} {'B antes':>10} {'B json':>10} {'B comp.':>10} {'cod.':>6} "
+          f"{'µs antes':>10} {'µs json':>10} {'µs comp.':>10} {'µs caché':>10}")
+    run_case('detalle (1 producto)',
+             lambda: detail_envelope(items[0]),
+             lambda: detail_envelope(cache.get(items[0])), args.iterations)
+    if len(items) > PAGE_SIZE:
+        page = items[:PAGE_SIZE]
+        run_case(f'página ({PAGE_SIZE})',
+                 lambda: envelope(page, len(page)),
+                 lambda: envelope(cache.array(page), len(page)), args.iterations)
+    else:
+        print(f"{f'página ({PAGE_SIZE})':<26} omitida: el catálogo tiene {len(items)} productos (usar --scale)")
+    run_case(f'catálogo completo ({len(items)})',
+             lambda: envelope(items, len(items)),
+             lambda: envelope(cache.array(items), len(items)), args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,627 @@
+#!/usr/bin/env python3
+"""
+Catálogo compartido entre procesos de Credicálidda
+Un coordinador publica el catálogo y sus índices en memoria compartida;
+los workers del servidor se conectan en solo lectura y cambian de versión
+cuando el contador de generación aumenta
+
+Uso:
+    python catalog_store.py publish --catalog data/catalogo.json
+    python catalog_store.py check --catalog data/catalogo.json
+    CATALOG_SHM=calidda-catalog python server.py
+    python catalog_store.py unpublish
+"""
+
+import argparse
+import atexit
+import bisect
+import json
+import re
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+from api_serializer import RawJSON, dumps
+
+DEFAULT_CONTROL_NAME = 'calidda-catalog'
+
+# Segmento de control: magic + época + generación escrita dos veces (lectura sin locks).
+# La época (time_ns al crear el control) distingue un control recreado tras unpublish.
+CONTROL_MAGIC = b'CALCTL02'
+CONTROL_FORMAT = '<8sQQQ'
+CONTROL_SIZE = struct.calcsize(CONTROL_FORMAT)
+# Intentos antes de rendirse ante una generación a medio escribir o un segmento ausente
+READ_RETRIES = 100
+# Cada cuánto un worker sin peticiones revisa si hay una generación nueva (segundos)
+POLL_INTERVAL = 5.0
+
+# Segmento de datos: magic + largo del encabezado JSON + encabezado + secciones
+SEGMENT_MAGIC = b'CALCAT01'
+SEGMENT_PREFIX = '<8sQ'
+
+FLAG_DESTACADO = 1
+FLAG_MAS_VENDIDO = 2
+FLAG_VISIBLE = 4
+
+
+def catalog_stats(products):
+    """Estadísticas del catálogo (mismas que expone /api/stats)"""
+    prices = [p.get('price_online', 0) for p in products if p.get('price_online')]
+    return {
+        'total_products': len(products),
+        'visible_products': len([p for p in products if p.get('visible', True)]),
+        'destacados': len([p for p in products if p.get('destacado', False)]),
+        'mas_vendidos': len([p for p in products if p.get('mas_vendido', False)]),
+        'categories': len({p['categoria'] for p in products if p.get('categoria')}),
+        'brands': len({p['brand'] for p in products if p.get('brand')}),
+        'price_range': {
+            'min': min(prices, default=0),
+            'max': max(prices, default=0)
+        }
+    }
+
+
+def segment_name(control_name, epoch, generation):
+    """Nombre del segmento de datos de una generación"""
+    return f'{control_name}-{epoch:x}-{generation}'
+
+
+def _attach(name):
+    """Conectarse a un segmento existente sin que resource_tracker lo elimine al salir"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _create(name, size):
+    """Crear un segmento que sobrevive al proceso que lo crea"""
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _unlink(name):
+    """Eliminar el nombre de un segmento; la memoria se libera al cerrarlo el último lector"""
+    try:
+        # Con seguimiento: unlink() lo quita del resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    shm.unlink()
+    return True
+
+
+class _SegmentWriter:
+    """Acumula secciones alineadas a 8 bytes"""
+
+    def __init__(self):
+        self.chunks = []
+        self.sections = {}
+        self.size = 0
+
+    def add(self, name, data, fmt='B'):
+        data = bytes(data)
+        self.sections[name] = [self.size, len(data), fmt]
+        self.chunks.append(data)
+        self.size += len(data)
+        padding = -self.size % 8
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.size += padding
+
+
+def _pack(fmt, values):
+    return struct.pack(f'<{len(values)}{fmt}', *values)
+
+
+def _blob(parts):
+    """Concatenar partes en un blob con su tabla de offsets (n + 1)"""
+    offsets = [0]
+    for part in parts:
+        offsets.append(offsets[-1] + len(part))
+    return b''.join(parts), offsets
+
+
+def build_segment(catalog, epoch, generation):
+    """Serializar catálogo e índices al formato del segmento compartido"""
+    products = catalog.get('items', [])
+
+    lower_tables = {'categoria': [''], 'brand': ['']}
+    lower_ids = {'categoria': {'': 0}, 'brand': {'': 0}}
+    columns = {'categoria': [], 'brand': []}
+    prices, flags, slugs, search = [], [], [], []
+
+    for product in products:
+        for field in ('categoria', 'brand'):
+            value = (product.get(field) or '').lower()
+            if value not in lower_ids[field]:
+                lower_ids[field][value] = len(lower_tables[field])
+                lower_tables[field].append(value)
+            columns[field].append(lower_ids[field][value])
+
+        prices.append(float(product.get('price_online') or 0))
+        flags.append(
+            (FLAG_DESTACADO if product.get('destacado', False) else 0)
+            | (FLAG_MAS_VENDIDO if product.get('mas_vendido', False) else 0)
+            | (FLAG_VISIBLE if product.get('visible', True) else 0)
+        )
+        slugs.append((product.get('slug') or '').encode('utf-8'))
+        text = '\0'.join((product.get(field) or '').lower() for field in ('title', 'description', 'brand', 'slug'))
+        search.append(text.encode('utf-8') + b'\0')
+
+    products_blob, product_offsets = _blob([dumps(p) for p in products])
+    slugs_blob, slug_offsets = _blob(slugs)
+    search_blob, search_offsets = _blob(search)
+    slug_order = sorted(range(len(products)), key=lambda i: (slugs[i], i))
+
+    writer = _SegmentWriter()
+    writer.add('product_offsets', _pack('Q', product_offsets), 'Q')
+    writer.add('products', products_blob)
+    writer.add('price', _pack('d', prices), 'd')
+    writer.add('flags', bytes(flags))
+    writer.add('categoria', _pack('I', columns['categoria']), 'I')
+    writer.add('brand', _pack('I', columns['brand']), 'I')
+    writer.add('slug_offsets', _pack('Q', slug_offsets), 'Q')
+    writer.add('slugs', slugs_blob)
+    writer.add('slug_order', _pack('I', slug_order), 'I')
+    writer.add('search_offsets', _pack('Q', search_offsets), 'Q')
+    writer.add('search_text', search_blob)
+
+    header = json.dumps({
+        'epoch': epoch,
+        'generation': generation,
+        'count': len(products),
+        'sections': writer.sections,
+        'categoria_lower': lower_tables['categoria'],
+        'brand_lower': lower_tables['brand'],
+        'categories': sorted({p['categoria'] for p in products if p.get('categoria')}),
+        'brands': sorted({p['brand'] for p in products if p.get('brand')}),
+        'stats': catalog_stats(products),
+    }, ensure_ascii=False).encode('utf-8')
+
+    prefix = struct.pack(SEGMENT_PREFIX, SEGMENT_MAGIC, len(header))
+    base = len(prefix) + len(header)
+    base += -base % 8
+    return prefix + header.ljust(base - len(prefix), b'\0') + b''.join(writer.chunks)
+
+
+def read_control(control, retries=READ_RETRIES):
+    """
+    Leer (época, generación) publicadas.
+    Devuelve None si el control fue cerrado por unpublish, si aún no hay generación
+    o si las dos copias siguen distintas tras `retries` intentos.
+    """
+    for _ in range(retries):
+        magic, epoch, first, second = struct.unpack_from(CONTROL_FORMAT, control.buf)
+        if magic != CONTROL_MAGIC:
+            return None
+        if first == second:
+            return (epoch, first) if first else None
+    return None
+
+
+def publish(catalog, control_name=DEFAULT_CONTROL_NAME):
+    """
+    Publicar una nueva generación del catálogo (coordinador).
+    Crea el segmento nuevo, incrementa la generación y elimina el nombre del anterior;
+    los workers que aún lo usan lo conservan mapeado hasta soltarlo.
+    """
+    try:
+        control = _attach(control_name)
+    except FileNotFoundError:
+        control = _create(control_name, CONTROL_SIZE)
+        struct.pack_into(CONTROL_FORMAT, control.buf, 0, b'\0' * 8, time.time_ns(), 0, 0)
+        struct.pack_into('<8s', control.buf, 0, CONTROL_MAGIC)
+
+    try:
+        magic, epoch, first, second = struct.unpack_from(CONTROL_FORMAT, control.buf)
+        if magic != CONTROL_MAGIC:
+            raise RuntimeError(f'Segmento de control inválido o en cierre: {control_name}')
+        # El coordinador es el único escritor: si murió entre las dos escrituras, se repara
+        previous = max(first, second)
+        generation = previous + 1
+        data = build_segment(catalog, epoch, generation)
+
+        name = segment_name(control_name, epoch, generation)
+        _unlink(name)  # restos de una publicación interrumpida
+        segment = _create(name, len(data))
+        segment.buf[:len(data)] = data
+        segment.close()
+
+        # Se escribe la segunda copia primero: un lector que vea ambas iguales tiene un valor completo
+        struct.pack_into('<Q', control.buf, 24, generation)
+        struct.pack_into('<Q', control.buf, 16, generation)
+
+        # Con una escritura interrumpida cualquiera de las dos copias puede ser la publicada
+        for old in {first, second} - {0}:
+            _unlink(segment_name(control_name, epoch, old))
+        return generation
+    finally:
+        control.close()
+
+
+def unpublish(control_name=DEFAULT_CONTROL_NAME):
+    """
+    Eliminar el catálogo compartido y su segmento de control.
+    El control se marca como cerrado antes de eliminarlo para que los workers
+    conectados vuelvan a buscarlo por nombre (p. ej. tras un nuevo publish).
+    """
+    try:
+        control = _attach(control_name)
+    except FileNotFoundError:
+        return False
+    magic, epoch, first, second = struct.unpack_from(CONTROL_FORMAT, control.buf)
+    struct.pack_into('<8s', control.buf, 0, b'\0' * 8)
+    control.close()
+    if magic == CONTROL_MAGIC and max(first, second):
+        _unlink(segment_name(control_name, epoch, max(first, second)))
+    _unlink(control_name)
+    return True
+
+
+class CatalogSnapshot:
+    """Vista de solo lectura de una generación del catálogo compartido"""
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.refs = 0
+        self.retired = False
+        self._views = []
+
+        magic, header_len = struct.unpack_from(SEGMENT_PREFIX, shm.buf)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f'Segmento de catálogo inválido: {shm.name}')
+        start = struct.calcsize(SEGMENT_PREFIX)
+        header = json.loads(bytes(shm.buf[start:start + header_len]))
+        base = start + header_len
+        base += -base % 8
+
+        self.epoch = header['epoch']
+        self.generation = header['generation']
+        self.count = header['count']
+        self.categories = header['categories']
+        self.brands = header['brands']
+        self.stats = header['stats']
+        self.categoria_ids = {v: i for i, v in enumerate(header['categoria_lower'])}
+        self.brand_ids = {v: i for i, v in enumerate(header['brand_lower'])}
+
+        for name, (offset, length, fmt) in header['sections'].items():
+            view = shm.buf[base + offset:base + offset + length]
+            self._views.append(view)
+            if fmt != 'B':
+                view = view.cast(fmt)
+                self._views.append(view)
+            setattr(self, name, view)
+
+    def close(self):
+        """Liberar las vistas y desmapear el segmento"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self.shm.close()
+
+    def product_json(self, index):
+        """JSON ya codificado de un producto"""
+        return bytes(self.products[self.product_offsets[index]:self.product_offsets[index + 1]])
+
+    def slug_at(self, index):
+        return bytes(self.slugs[self.slug_offsets[index]:self.slug_offsets[index + 1]])
+
+    def find_slug(self, slug):
+        """Búsqueda binaria por slug (primer producto si hay duplicados)"""
+        target = slug.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.slug_at(self.slug_order[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.slug_at(self.slug_order[lo]) == target:
+            return self.slug_order[lo]
+        return None
+
+    def filter(self, filters):
+        """Índices de productos que cumplen los filtros (misma semántica que ProductManager)"""
+        indices = range(self.count)
+
+        if filters.get('categoria'):
+            wanted = self.categoria_ids.get(filters['categoria'].lower())
+            indices = [i for i in indices if self.categoria[i] == wanted]
+
+        if filters.get('brand'):
+            wanted = self.brand_ids.get(filters['brand'].lower())
+            indices = [i for i in indices if self.brand[i] == wanted]
+
+        if filters.get('min_price'):
+            min_price = float(filters['min_price'])
+            indices = [i for i in indices if self.price[i] >= min_price]
+
+        if filters.get('max_price'):
+            max_price = float(filters['max_price'])
+            indices = [i for i in indices if self.price[i] <= max_price]
+
+        if filters.get('destacado'):
+            indices = [i for i in indices if self.flags[i] & FLAG_DESTACADO]
+
+        if filters.get('mas_vendido'):
+            indices = [i for i in indices if self.flags[i] & FLAG_MAS_VENDIDO]
+
+        if filters.get('visible') is not None:
+            visible = filters['visible'].lower() == 'true'
+            indices = [i for i in indices if bool(self.flags[i] & FLAG_VISIBLE) == visible]
+
+        return list(indices)
+
+    def search(self, query):
+        """Índices de productos cuyo título, descripción, marca o slug contienen el texto"""
+        query = query.lower()
+        if not query:
+            # Igual que ProductManager: el texto vacío está contenido en todos los productos
+            return list(range(self.count))
+        if '\0' in query:
+            return []
+        pattern = re.compile(re.escape(query.encode('utf-8')))
+        results = []
+        pos = 0
+        while True:
+            match = pattern.search(self.search_text, pos)
+            if match is None:
+                return results
+            index = bisect.bisect_right(self.search_offsets, match.start()) - 1
+            if index >= self.count:
+                return results
+            results.append(index)
+            pos = self.search_offsets[index + 1]
+
+
+class SharedCatalogReader:
+    """
+    Lado worker: sigue la generación publicada y cuenta lectores por snapshot.
+    Un snapshot reemplazado se cierra en cuanto lo suelta su última petición; un hilo
+    revisa cada POLL_INTERVAL segundos para que los workers inactivos también lo suelten.
+    """
+
+    def __init__(self, control_name=DEFAULT_CONTROL_NAME, poll_interval=POLL_INTERVAL):
+        self.control_name = control_name
+        self.control = _attach(control_name)
+        self.lock = threading.Lock()
+        self.current = None
+        self._switch()
+        if self.current is None:
+            self.control.close()
+            raise RuntimeError(f'No hay catálogo publicado en {self.control_name}')
+        self._stop = threading.Event()
+        if poll_interval:
+            threading.Thread(target=self._poll, args=(poll_interval,), daemon=True).start()
+        atexit.register(self.close)
+
+    def _read_state(self):
+        """(época, generación) publicadas; reconecta el control si fue recreado"""
+        state = read_control(self.control) if self.control is not None else None
+        if state is None:
+            try:
+                control = _attach(self.control_name)
+            except FileNotFoundError:
+                return None
+            if self.control is not None:
+                self.control.close()
+            self.control = control
+            state = read_control(control)
+        return state
+
+    def _switch(self):
+        """
+        Conectarse a la generación publicada si es distinta de la actual.
+        Si no se puede (control cerrado, segmento ausente), se sigue usando la actual.
+        """
+        for _ in range(READ_RETRIES):
+            state = self._read_state()
+            if state is None:
+                return
+            if self.current is not None and (self.current.epoch, self.current.generation) == state:
+                return
+            try:
+                shm = _attach(segment_name(self.control_name, *state))
+            except FileNotFoundError:
+                continue  # se publicó otra generación mientras tanto
+            previous, self.current = self.current, CatalogSnapshot(shm)
+            if previous is not None:
+                previous.retired = True
+                if previous.refs == 0:
+                    previous.close()
+            return
+
+    def refresh(self):
+        """Cambiar a la generación publicada si hay una nueva"""
+        with self.lock:
+            if self.current is not None:
+                self._switch()
+
+    def _poll(self, interval):
+        while not self._stop.wait(interval):
+            self.refresh()
+
+    def acquire(self):
+        """Obtener la generación más reciente para una petición"""
+        with self.lock:
+            self._switch()
+            self.current.refs += 1
+            return self.current
+
+    def release(self, snapshot):
+        """Terminar de usar un snapshot; se cierra si ya fue reemplazado"""
+        with self.lock:
+            snapshot.refs -= 1
+            self._switch()
+            if snapshot.retired and snapshot.refs == 0:
+                snapshot.close()
+
+    def close(self):
+        """Desconectarse del catálogo compartido (al terminar el worker)"""
+        self._stop.set()
+        with self.lock:
+            if self.current is not None:
+                self.current.close()
+                self.current = None
+            if self.control is not None:
+                self.control.close()
+                self.control = None
+
+
+SharedProduct = namedtuple('SharedProduct', ['snapshot', 'index'])
+
+
+class SharedProductList:
+    """Lista de productos de un snapshot (índices), con len, slicing e iteración"""
+
+    __slots__ = ('snapshot', 'indices')
+
+    def __init__(self, snapshot, indices):
+        self.snapshot = snapshot
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return SharedProductList(self.snapshot, self.indices[key])
+        return SharedProduct(self.snapshot, self.indices[key])
+
+    def __iter__(self):
+        return (SharedProduct(self.snapshot, i) for i in self.indices)
+
+
+class SharedEncodedProducts:
+    """Fragmentos JSON tomados directamente del snapshot (interfaz de EncodedProductCache)"""
+
+    def get(self, product):
+        return RawJSON(product.snapshot.product_json(product.index))
+
+    def array(self, products):
+        if isinstance(products, SharedProductList):
+            snapshot = products.snapshot
+            return RawJSON.array(RawJSON(snapshot.product_json(i)) for i in products.indices)
+        return RawJSON.array(self.get(p) for p in products)
+
+
+class SharedProductManager:
+    """
+    Gestor de productos sobre el catálogo compartido.
+    Misma interfaz que ProductManager; los productos son referencias SharedProduct
+    y su JSON se toma directamente de la memoria compartida.
+    """
+
+    def __init__(self, control_name=DEFAULT_CONTROL_NAME):
+        self.reader = SharedCatalogReader(control_name)
+        self.encoded = SharedEncodedProducts()
+        self._local = threading.local()
+
+    @property
+    def snapshot(self):
+        return getattr(self._local, 'snapshot', None) or self.reader.current
+
+    @property
+    def version(self):
+        """(época, generación): crece con cada publicación, también tras recrear el control"""
+        return (self.snapshot.epoch, self.snapshot.generation)
+
+    def begin_request(self):
+        """Fijar la generación usada durante la petición actual"""
+        self._local.snapshot = self.reader.acquire()
+
+    def end_request(self):
+        snapshot = getattr(self._local, 'snapshot', None)
+        if snapshot is not None:
+            self._local.snapshot = None
+            self.reader.release(snapshot)
+
+    def get_all_products(self, filters=None):
+        snapshot = self.snapshot
+        return SharedProductList(snapshot, snapshot.filter(filters or {}))
+
+    def get_product_by_slug(self, slug):
+        snapshot = self.snapshot
+        index = snapshot.find_slug(slug)
+        return None if index is None else SharedProduct(snapshot, index)
+
+    def get_categories(self):
+        return self.snapshot.categories
+
+    def get_brands(self):
+        return self.snapshot.brands
+
+    def search_products(self, query):
+        snapshot = self.snapshot
+        return SharedProductList(snapshot, snapshot.search(query))
+
+    def get_stats(self):
+        return self.snapshot.stats
+
+
+def check(catalog, control_name=DEFAULT_CONTROL_NAME):
+    """
+    Comparar el catálogo publicado con el archivo: cada slug (incluido el primer
+    producto, índice 0) debe resolver al mismo producto. Devuelve la lista de errores.
+    """
+    manager = SharedProductManager(control_name)
+    errors = []
+    products = catalog.get('items', [])
+    seen = set()
+    for position, product in enumerate(products):
+        slug = product.get('slug')
+        if not slug or slug in seen:
+            continue
+        seen.add(slug)
+        found = manager.get_product_by_slug(slug)
+        if found is None:
+            errors.append(f'#{position} {slug}: no encontrado')
+        elif json.loads(manager.encoded.get(found).data) != product:
+            errors.append(f'#{position} {slug}: producto distinto')
+    if manager.get_stats() != json.loads(json.dumps(catalog_stats(products))):
+        errors.append('estadísticas distintas')
+    manager.reader.close()
+    return errors
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Publicar el catálogo en memoria compartida')
+    parser.add_argument('command', choices=['publish', 'unpublish', 'check'])
+    parser.add_argument('--catalog', default='data/catalogo.json', help='Catálogo a publicar')
+    parser.add_argument('--name', default=DEFAULT_CONTROL_NAME, help='Nombre del segmento de control')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        with open(args.catalog, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        generation = publish(catalog, args.name)
+        print(f"📢 Catálogo publicado en '{args.name}': generación {generation}, "
+              f"{len(catalog.get('items', []))} productos")
+    elif args.command == 'check':
+        with open(args.catalog, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        errors = check(catalog, args.name)
+        for error in errors:
+            print(f"   {error}")
+        print(f"❌ {len(errors)} diferencias con {args.catalog}" if errors
+              else f"✅ Catálogo compartido '{args.name}' coincide con {args.catalog}")
+        return 1 if errors else 0
+    else:
+        removed = unpublish(args.name)
+        print(f"🧹 Catálogo compartido '{args.name}' eliminado" if removed else f"ℹ️  No existe '{args.name}'")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+Importador masivo de productos para el catálogo de Credicálidda
+Lee feeds CSV/JSONL en streaming, normaliza las filas en paralelo y
+fusiona el resultado en data/catalogo.json de forma atómica
+
+Uso:
+    python import_catalog.py feed.csv
+    python import_catalog.py feed.jsonl --workers 4 --rejects rechazados.jsonl
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+CATALOG_PATH = 'data/catalogo.json'
+CATEGORIES_DIR = '_categorias'
+
+# Campos del catálogo (ver admin/config.yml, colección "catalogo")
+TEXT_FIELDS = ['title', 'brand', 'image', 'sku']
+HTML_FIELDS = ['description', 'shipping', 'payment_credit_html', 'payment_cash_html', 'shipping_html']
+PRICE_FIELDS = ['price_regular', 'price_online', 'monthly_payment']
+BOOL_FIELDS = [
+    'visible', 'destacado', 'mas_vendido', 'show_payment_credit', 'show_payment_cash',
+    'show_monthly', 'show_price_online', 'show_shipping'
+]
+LIST_FIELDS = ['gallery', 'tags', 'payment_methods']
+PAYMENT_METHODS = {'bcp', 'yape', 'plin'}
+TAGS = {'destacado', 'novedad', 'oferta', 'combo', 'reacondicionado', 'mas-vendido'}
+REQUIRED_FOR_NEW = ['title', 'categoria', 'price_online']
+
+# Separador de valores múltiples en columnas CSV (gallery, tags, specs...)
+LIST_SEPARATOR = '|'
+
+
+def slugify(text, keep_slash=False):
+    """
+    Generar slug URL amigable (sin tildes, minúsculas, guiones).
+    Con keep_slash se conserva '/', usado por los slugs del catálogo terminados en '/p'.
+    """
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    pattern = r'[^a-z0-9/]+' if keep_slash else r'[^a-z0-9]+'
+    return re.sub(pattern, '-', text.lower()).strip('-/')
+
+
+def load_categories(categories_dir=CATEGORIES_DIR):
+    """Mapa alias -> slug de categoría a partir del front matter de _categorias/*.md"""
+    aliases = {}
+    for filename in sorted(os.listdir(categories_dir)):
+        if not filename.endswith('.md'):
+            continue
+        meta = {}
+        with open(os.path.join(categories_dir, filename), 'r', encoding='utf-8') as f:
+            if f.readline().strip() != '---':
+                continue
+            for line in f:
+                if line.strip() == '---':
+                    break
+                key, _, value = line.partition(':')
+                meta[key.strip()] = value.strip().strip('"\'')
+        slug = meta.get('slug') or filename[:-3]
+        for alias in (slug, meta.get('title', ''), filename[:-3]):
+            if alias:
+                aliases[slugify(alias)] = slug
+    return aliases
+
+
+class HTMLSanitizer(HTMLParser):
+    """Sanitizador HTML por lista blanca (etiquetas de formato y enlaces seguros)"""
+
+    ALLOWED_TAGS = {
+        'p', 'br', 'ul', 'ol', 'li', 'strong', 'b', 'em', 'i', 'u', 'span', 'div',
+        'h2', 'h3', 'h4', 'h5', 'a', 'table', 'thead', 'tbody', 'tr', 'th', 'td'
+    }
+    VOID_TAGS = {'br'}
+    DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template'}
+    SAFE_HREF = re.compile(r'^(https?:|mailto:|tel:|/|#)', re.IGNORECASE)
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.DROP_CONTENT_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth or tag not in self.ALLOWED_TAGS:
+            return
+        if tag == 'a':
+            href = dict(attrs).get('href') or ''
+            if self.SAFE_HREF.match(href.strip()):
+                self.parts.append('<a href="%s" rel="noopener">' % href.strip().replace('"', '&quot;'))
+                return
+        self.parts.append('<%s>' % tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.DROP_CONTENT_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth or tag not in self.ALLOWED_TAGS or tag in self.VOID_TAGS:
+            return
+        self.parts.append('</%s>' % tag)
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            # Markdown se conserva; solo se neutraliza el inicio de etiquetas
+            self.parts.append(data.replace('<', '&lt;'))
+
+
+def sanitize_html(text):
+    """Limpiar HTML/Markdown dejando solo etiquetas permitidas"""
+    sanitizer = HTMLSanitizer()
+    sanitizer.feed(text)
+    sanitizer.close()
+    return ''.join(sanitizer.parts)
+
+
+def parse_price(value):
+    """Convertir precios como 'S/ 1,659.90' a número"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = float(value)
+    else:
+        text = re.sub(r'(?i)s/\.?|\s', '', str(value)).replace(',', '')
+        number = float(text)
+    if number != number or number in (float('inf'), float('-inf')):
+        raise ValueError('no es un número finito')
+    return int(number) if number.is_integer() else round(number, 2)
+
+
+def parse_bool(value):
+    """Convertir valores tipo true/1/si/x a booleano"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', '1', 'si', 'sí', 'yes', 'x'):
+        return True
+    if text in ('false', '0', 'no', ''):
+        return False
+    raise ValueError(f'valor booleano inválido: {value!r}')
+
+
+def parse_list(value):
+    """Listas nativas (JSONL) o valores separados por '|' (CSV)"""
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(LIST_SEPARATOR) if v.strip()]
+
+
+def parse_specs(value):
+    """Especificaciones como lista de {name, value} o 'Nombre: valor|...'"""
+    if isinstance(value, list):
+        specs = [s for s in value if isinstance(s, dict) and s.get('name')]
+        return [{'name': str(s['name']).strip(), 'value': str(s.get('value', '')).strip()} for s in specs]
+    specs = []
+    for part in parse_list(value):
+        name, _, spec_value = part.partition(':')
+        specs.append({'name': name.strip(), 'value': spec_value.strip()})
+    return specs
+
+
+_categories = {}
+
+
+def _init_worker(categories):
+    """Inicializar cada proceso del pool con el mapa de categorías"""
+    global _categories
+    _categories = categories
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def normalize_row(line_no, row, categories=None):
+    """
+    Normalizar una fila del feed a un producto del catálogo.
+    Devuelve (line_no, producto, error); solo incluye los campos presentes en la fila.
+    """
+    categories = _categories if categories is None else categories
+    if not isinstance(row, dict):
+        return line_no, None, 'la fila no es un objeto JSON válido'
+
+    item = {}
+    try:
+        for field in TEXT_FIELDS:
+            if not _is_empty(row.get(field)):
+                item[field] = re.sub(r'\s+', ' ', str(row[field])).strip()
+
+        for field in HTML_FIELDS:
+            if not _is_empty(row.get(field)):
+                item[field] = sanitize_html(str(row[field]))
+
+        for field in PRICE_FIELDS:
+            if not _is_empty(row.get(field)):
+                try:
+                    item[field] = parse_price(row[field])
+                except ValueError:
+                    return line_no, None, f'{field} inválido: {row[field]!r}'
+                if item[field] <= 0:
+                    return line_no, None, f'{field} debe ser mayor que 0'
+
+        for field in BOOL_FIELDS:
+            if not _is_empty(row.get(field)):
+                item[field] = parse_bool(row[field])
+
+        for field in LIST_FIELDS:
+            if not _is_empty(row.get(field)):
+                item[field] = parse_list(row[field])
+
+        if not _is_empty(row.get('specs')):
+            item['specs'] = parse_specs(row['specs'])
+
+        if not _is_empty(row.get('discount')):
+            discount = int(parse_price(row['discount']))
+            if not 0 <= discount <= 100:
+                return line_no, None, 'discount debe estar entre 0 y 100'
+            item['discount'] = discount
+    except ValueError as e:
+        return line_no, None, str(e)
+
+    if 'payment_methods' in item:
+        invalid = set(item['payment_methods']) - PAYMENT_METHODS
+        if invalid:
+            return line_no, None, f'payment_methods desconocidos: {", ".join(sorted(invalid))}'
+    if 'tags' in item:
+        invalid = set(item['tags']) - TAGS
+        if invalid:
+            return line_no, None, f'tags desconocidos: {", ".join(sorted(invalid))}'
+
+    if not _is_empty(row.get('categoria')):
+        categoria = categories.get(slugify(row['categoria']))
+        if not categoria:
+            return line_no, None, f'categoría desconocida: {row["categoria"]!r}'
+        item['categoria'] = categoria
+
+    price_online = item.get('price_online')
+    if price_online is not None:
+        if item.get('price_regular') is not None and item['price_regular'] < price_online:
+            return line_no, None, 'price_regular es menor que price_online'
+        if item.get('monthly_payment') is not None and item['monthly_payment'] > price_online:
+            return line_no, None, 'monthly_payment es mayor que price_online'
+
+    if not _is_empty(row.get('slug')):
+        raw_slug = str(row['slug']).strip()
+        item['slug'] = slugify(raw_slug, keep_slash=True)
+        if not item['slug']:
+            return line_no, None, f'slug inválido: {row["slug"]!r}'
+        if raw_slug != item['slug']:
+            # El slug tal cual se busca primero entre los existentes al fusionar
+            item['_slug_raw'] = raw_slug
+    elif item.get('title'):
+        # Slug sugerido; la deduplicación se hace al fusionar
+        base = item['title'] if 'sku' not in item else f"{item['title']} {item['sku']}"
+        item['_slug_base'] = slugify(base)
+
+    return line_no, item, None
+
+
+def normalize_batch(batch):
+    """Normalizar un lote de filas (se ejecuta en los procesos del pool)"""
+    return [normalize_row(line_no, row) for line_no, row in batch]
+
+
+def detect_format(path):
+    """Formato del feed según la extensión"""
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_rows(path, feed_format):
+    """Leer el feed fila a fila sin cargarlo completo en memoria"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if feed_format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    # Se conserva el texto para poder reportar la fila rechazada
+                    yield line_no, line.rstrip('\r\n')
+
+
+def batched(rows, size):
+    """Agrupar filas en lotes"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _with_rows(results, batch):
+    """Agregar la fila original a cada resultado: (line_no, fila, producto, error)"""
+    for (line_no, item, error), (_, row) in zip(results, batch):
+        yield line_no, row, item, error
+
+
+def normalize_rows(rows, categories, workers, batch_size):
+    """
+    Normalizar filas en paralelo conservando el orden del feed.
+    Mantiene como máximo 2 lotes por proceso en vuelo para no leer el feed completo.
+    Las filas originales se quedan en este proceso (no vuelven del pool) para
+    reportar las rechazadas.
+    """
+    if workers <= 1:
+        _init_worker(categories)
+        for batch in batched(rows, batch_size):
+            yield from _with_rows(normalize_batch(batch), batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(categories,)) as pool:
+        pending = deque()
+        for batch in batched(rows, batch_size):
+            pending.append((pool.submit(normalize_batch, batch), batch))
+            if len(pending) >= workers * 2:
+                future, done = pending.popleft()
+                yield from _with_rows(future.result(), done)
+        while pending:
+            future, done = pending.popleft()
+            yield from _with_rows(future.result(), done)
+
+
+class CatalogMerger:
+    """
+    Fusiona productos normalizados con el catálogo existente.
+    Un producto del feed actualiza al existente si coincide por slug, por sku o,
+    sin ninguno de los dos, por el slug generado desde el título. Si coincide
+    solo por sku se conserva el slug existente para no romper enlaces.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.items = catalog.setdefault('items', [])
+        self.by_slug = {item.get('slug'): item for item in self.items if item.get('slug')}
+        self.by_sku = {str(item['sku']): item for item in self.items if item.get('sku')}
+        self.feed_slugs = set()
+        self.feed_skus = set()
+        self.next_order = max((item.get('orden') or 0 for item in self.items), default=0) + 1
+        self.created = 0
+        self.updated = 0
+
+    def unique_slug(self, base):
+        """Slug libre a partir de una base (agrega -2, -3... si ya existe)"""
+        slug, suffix = base, 2
+        while slug in self.by_slug:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        return slug
+
+    def feed_slug(self, base):
+        """Slug para una fila sin slug ni sku: -2, -3... solo entre filas del mismo feed"""
+        slug, suffix = base, 2
+        while slug in self.feed_slugs:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        return slug
+
+    def add(self, item):
+        """Agregar o actualizar un producto; devuelve un mensaje de error o None"""
+        item = dict(item)
+        slug_base = item.pop('_slug_base', None)
+        slug_raw = item.pop('_slug_raw', None)
+        slug = item.get('slug')
+        sku = item.get('sku')
+
+        if sku is not None and sku in self.feed_skus:
+            return f'sku duplicado en el feed: {sku}'
+
+        if slug:
+            existing = self.by_slug.get(slug_raw) if slug_raw else None
+            if existing is None:
+                existing = self.by_slug.get(slug)
+            if sku is not None and sku in self.by_sku:
+                # Un sku existente identifica al producto aunque el slug del feed sea otro
+                if existing is None:
+                    existing = self.by_sku[sku]
+                elif existing is not self.by_sku[sku]:
+                    return f'slug {slug} y sku {sku} corresponden a productos distintos'
+            if existing is not None:
+                slug = existing['slug']
+            if slug in self.feed_slugs:
+                return f'slug duplicado en el feed: {slug}'
+        elif sku is not None and sku in self.by_sku:
+            existing = self.by_sku[sku]
+            slug = existing['slug']
+        elif slug_base and sku is not None:
+            # sku nuevo: producto nuevo aunque el slug generado ya exista
+            existing = None
+            slug = self.unique_slug(slug_base)
+        elif slug_base:
+            # Sin slug ni sku, repetir el mismo feed actualiza en lugar de duplicar
+            slug = self.feed_slug(slug_base)
+            existing = self.by_slug.get(slug)
+        else:
+            return 'falta slug o title'
+
+        if existing is not None:
+            item['slug'] = slug
+            error = self.validate(dict(existing, **item), REQUIRED_FOR_NEW)
+            if error:
+                return error
+            existing.update(item)
+            self._track(existing)
+            self.updated += 1
+            return None
+
+        error = self.validate(item, REQUIRED_FOR_NEW)
+        if error:
+            return error
+
+        product = {
+            'slug': slug,
+            'visible': True,
+            'destacado': False,
+            'mas_vendido': False,
+            'orden': self.next_order,
+        }
+        product.update(item)
+        product['slug'] = slug
+        self.items.append(product)
+        self._track(product)
+        self.next_order += 1
+        self.created += 1
+        return None
+
+    def _track(self, product):
+        """Registrar un producto agregado o actualizado por este feed"""
+        self.by_slug[product['slug']] = product
+        self.feed_slugs.add(product['slug'])
+        if product.get('sku'):
+            self.by_sku[str(product['sku'])] = product
+            self.feed_skus.add(str(product['sku']))
+
+    @staticmethod
+    def validate(item, required):
+        """Validar campos obligatorios y coherencia de precios del producto final"""
+        missing = [field for field in required if _is_empty(item.get(field))]
+        if missing:
+            return f'faltan campos obligatorios: {", ".join(missing)}'
+        price_online = item['price_online']
+        if item.get('price_regular') and item['price_regular'] < price_online:
+            return 'price_regular es menor que price_online'
+        if item.get('monthly_payment') and item['monthly_payment'] > price_online:
+            return 'monthly_payment es mayor que price_online'
+        return None
+
+
+def load_catalog(path):
+    """Leer el catálogo actual (mismo formato que ProductManager.load_catalog)"""
+    if not os.path.exists(path):
+        return {'items': []}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_catalog(path, catalog):
+    """Escribir el catálogo de forma atómica (archivo temporal + os.replace)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.catalogo-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def main(argv=None):
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Importar un feed CSV/JSONL de productos al catálogo')
+    parser.add_argument('feed', help='Archivo .csv o .jsonl del proveedor')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Formato del feed (por defecto según extensión)')
+    parser.add_argument('--catalog', default=CATALOG_PATH, help='Catálogo a actualizar')
+    parser.add_argument('--categorias', default=CATEGORIES_DIR, help='Directorio de categorías')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos para normalizar')
+    parser.add_argument('--batch-size', type=int, default=500, help='Filas por lote enviado a cada proceso')
+    parser.add_argument('--rejects', help='Guardar filas rechazadas (línea, error y fila original) en este archivo JSONL')
+    parser.add_argument('--dry-run', action='store_true', help='Validar sin escribir el catálogo')
+    args = parser.parse_args(argv)
+
+    categories = load_categories(args.categorias)
+    catalog = load_catalog(args.catalog)
+    merger = CatalogMerger(catalog)
+    feed_format = args.format or detect_format(args.feed)
+
+    rejected = []
+    total = 0
+    start = time.perf_counter()
+    rows = read_rows(args.feed, feed_format)
+    for line_no, row, item, error in normalize_rows(rows, categories, args.workers, args.batch_size):
+        total += 1
+        if error is None:
+            error = merger.add(item)
+        if error is not None:
+            rejected.append({'line': line_no, 'error': error, 'row': row})
+    elapsed = time.perf_counter() - start
+
+    if not args.dry_run and (merger.created or merger.updated):
+        write_catalog(args.catalog, catalog)
+
+    if args.rejects:
+        with open(args.rejects, 'w', encoding='utf-8') as f:
+            for reject in rejected:
+                f.write(json.dumps(reject, ensure_ascii=False) + '\n')
+
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"📦 Filas procesadas: {total} en {elapsed:.2f}s ({rate:,.0f} filas/s, {args.workers} procesos)")
+    print(f"✅ Nuevos: {merger.created} | 🔄 Actualizados: {merger.updated} | ❌ Rechazados: {len(rejected)}")
+    for reject in rejected[:20]:
+        print(f"   línea {reject['line']}: {reject['error']}")
+    if len(rejected) > 20:
+        print(f"   ... y {len(rejected) - 20} más")
+    if args.dry_run:
+        print("ℹ️  Modo --dry-run: el catálogo no fue modificado")
+    elif merger.created or merger.updated:
+        print(f"💾 Catálogo actualizado: {args.catalog} ({len(catalog['items'])} productos)")
+
+    return 1 if rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,11 +7,15 @@ Desarrollado para pruebas en producción
 import json
 import os
 import re
+import threading
 from datetime import datetime
-from flask import Flask, render_template_string, jsonify, request, send_from_directory, redirect, url_for
+from flask import Flask, Response, g, render_template_string, request, send_from_directory, redirect, url_for
 from flask_cors import CORS
 import logging
 
+from api_serializer import CompressedResponseCache, EncodedProductCache, JSON_BACKEND, choose_encoding, compress, dumps
+from catalog_store import SharedProductManager, catalog_stats
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,24 +26,78 @@ CORS(app)  # Habilitar CORS para desarrollo
 # Configuración
 PORT = int(os.environ.get('PORT', 3000))
 DEBUG = os.environ.get('DEBUG', 'True').lower() == 'true'
+CATALOG_SHM = os.environ.get('CATALOG_SHM')  # Nombre del catálogo compartido (ver catalog_store.py)
 
 class ProductManager:
     """Gestor de productos del catálogo"""
     
     def __init__(self, catalog_path='data/catalogo.json'):
         self.catalog_path = catalog_path
-        self.catalog = self.load_catalog()
+        self.version = 0
+        self.catalog_stat = None
+        self.catalog = {"items": []}
+        self.encoded = EncodedProductCache()
+        self.reload_lock = threading.Lock()
+        self.reload_catalog()
+    
+    def _stat_catalog(self):
+        """Fecha de modificación y tamaño del archivo del catálogo"""
+        try:
+            stat = os.stat(self.catalog_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+    
+    def reload_catalog(self):
+        """Recargar catálogo y regenerar productos pre-codificados"""
+        with self.reload_lock:
+            self._reload()
+    
+    def refresh_if_changed(self):
+        """Recargar si catalogo.json cambió en disco (CMS o import_catalog.py)"""
+        if self._stat_catalog() == self.catalog_stat:
+            return
+        with self.reload_lock:
+            # Otro hilo pudo haber recargado este mismo cambio mientras se esperaba
+            if self._stat_catalog() != self.catalog_stat:
+                logger.info("Catálogo modificado en disco, recargando")
+                self._reload()
     
-    def load_catalog(self):
-        """Cargar catálogo desde JSON"""
+    def _reload(self):
+        """
+        Construir el catálogo y su caché en variables locales y publicarlos juntos.
+        La versión se incrementa al final: quien la lee ya ve el catálogo nuevo.
+        Llamar con reload_lock tomado.
+        """
+        catalog_stat = self._stat_catalog()
         try:
-            with open(self.catalog_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logger.info(f"Catálogo cargado: {len(data.get('items', []))} productos")
-                return data
+            catalog = self.read_catalog()
         except Exception as e:
+            # Archivo a medio escribir o inválido: en una recarga se mantiene el catálogo actual
+            self.catalog_stat = catalog_stat
+            if self.version:
+                logger.error(f"Error recargando catálogo, se mantiene la versión {self.version}: {e}")
+                return
             logger.error(f"Error cargando catálogo: {e}")
-            return {"items": []}
+            catalog = {"items": []}
+        else:
+            logger.info(f"Catálogo cargado: {len(catalog.get('items', []))} productos")
+        
+        version = self.version + 1
+        encoded = EncodedProductCache()
+        encoded.rebuild(catalog.get('items', []), version)
+        self.catalog_stat = catalog_stat
+        self.catalog = catalog
+        self.encoded = encoded
+        self.version = version
+    
+    def read_catalog(self):
+        """Leer catalogo.json (lanza excepción si está incompleto o no es válido)"""
+        with open(self.catalog_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or not isinstance(data.get('items', []), list):
+            raise ValueError("el catálogo no tiene una lista 'items'")
+        return data
     
     def get_all_products(self, filters=None):
         """Obtener todos los productos con filtros opcionales"""
@@ -142,9 +200,66 @@ class ProductManager:
                 continue
         
         return results
+    
+    def get_stats(self):
+        """Estadísticas del catálogo"""
+        return catalog_stats(self.catalog.get('items', []))
+
+def create_product_manager():
+    """Usar el catálogo compartido si CATALOG_SHM está configurado"""
+    if CATALOG_SHM:
+        try:
+            manager = SharedProductManager(CATALOG_SHM)
+            logger.info(f"Catálogo compartido '{CATALOG_SHM}': generación {manager.version}")
+            return manager
+        except Exception as e:
+            logger.error(f"Error conectando al catálogo compartido '{CATALOG_SHM}': {e}")
+    return ProductManager()
 
 # Inicializar gestor de productos
-product_manager = ProductManager()
+product_manager = create_product_manager()
+logger.info(f"Serializador JSON: {JSON_BACKEND}")
+
+response_cache = CompressedResponseCache()
+
+def api_response(payload, status=200):
+    """Respuesta JSON de la API, comprimida según Accept-Encoding"""
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    # Las respuestas /api/* dependen solo de la versión del catálogo y de la URL
+    version = g.get('catalog_version', product_manager.version)
+    cache_key = (request.full_path, choose_encoding(accept_encoding))
+    cached = response_cache.get(version, cache_key) if status == 200 else None
+    if cached is not None:
+        body, encoding = cached
+    else:
+        body, encoding = compress(dumps(payload), accept_encoding)
+        # Solo se guardan las comprimidas: son las que cuestan CPU
+        if status == 200 and encoding:
+            response_cache.put(version, cache_key, (body, encoding))
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+if isinstance(product_manager, ProductManager):
+    @app.before_request
+    def refresh_catalog():
+        """Recargar el catálogo local si el archivo cambió"""
+        product_manager.refresh_if_changed()
+        g.catalog_version = product_manager.version
+
+if isinstance(product_manager, SharedProductManager):
+    @app.before_request
+    def begin_catalog_request():
+        """Tomar la generación más reciente del catálogo compartido"""
+        product_manager.begin_request()
+        g.catalog_version = product_manager.version
+    
+    @app.teardown_request
+    def end_catalog_request(exc):
+        """Soltar la generación usada por la petición"""
+        product_manager.end_request()
 
 # Rutas principales
 @app.route('/')
@@ -182,10 +297,10 @@ def api_products():
         end = start + per_page
         paginated_products = products[start:end]
         
-        return jsonify({
+        return api_response({
             'success': True,
             'data': {
-                'products': paginated_products,
+                'products': product_manager.encoded.array(paginated_products),
                 'pagination': {
                     'page': page,
                     'per_page': per_page,
@@ -198,27 +313,27 @@ def api_products():
     
     except Exception as e:
         logger.error(f"Error en API products: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return api_response({'success': False, 'error': str(e)}, 500)
 
 @app.route('/api/products/<slug>', methods=['GET'])
 def api_product_detail(slug):
     """API: Obtener detalle de producto por slug"""
     try:
         product = product_manager.get_product_by_slug(slug)
-        if product:
-            return jsonify({
+        if product is not None:
+            return api_response({
                 'success': True,
-                'data': product
+                'data': product_manager.encoded.get(product)
             })
         else:
-            return jsonify({
+            return api_response({
                 'success': False,
                 'error': 'Producto no encontrado'
-            }), 404
+            }, 404)
     
     except Exception as e:
         logger.error(f"Error en API product detail: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return api_response({'success': False, 'error': str(e)}, 500)
 
 @app.route('/api/search', methods=['GET'])
 def api_search():
@@ -226,81 +341,68 @@ def api_search():
     try:
         query = request.args.get('q', '')
         if not query:
-            return jsonify({
+            return api_response({
                 'success': False,
                 'error': 'Query parameter "q" is required'
-            }), 400
+            }, 400)
         
         results = product_manager.search_products(query)
         
-        return jsonify({
+        return api_response({
             'success': True,
             'data': {
                 'query': query,
-                'results': results,
+                'results': product_manager.encoded.array(results),
                 'count': len(results)
             }
         })
     
     except Exception as e:
         logger.error(f"Error en API search: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return api_response({'success': False, 'error': str(e)}, 500)
 
 @app.route('/api/categories', methods=['GET'])
 def api_categories():
     """API: Obtener categorías"""
     try:
         categories = product_manager.get_categories()
-        return jsonify({
+        return api_response({
             'success': True,
             'data': categories
         })
     
     except Exception as e:
         logger.error(f"Error en API categories: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return api_response({'success': False, 'error': str(e)}, 500)
 
 @app.route('/api/brands', methods=['GET'])
 def api_brands():
     """API: Obtener marcas"""
     try:
         brands = product_manager.get_brands()
-        return jsonify({
+        return api_response({
             'success': True,
             'data': brands
         })
     
     except Exception as e:
         logger.error(f"Error en API brands: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return api_response({'success': False, 'error': str(e)}, 500)
 
 @app.route('/api/stats', methods=['GET'])
 def api_stats():
     """API: Estadísticas del catálogo"""
     try:
-        products = product_manager.get_all_products()
-        
-        stats = {
-            'total_products': len(products),
-            'visible_products': len([p for p in products if p.get('visible', True)]),
-            'destacados': len([p for p in products if p.get('destacado', False)]),
-            'mas_vendidos': len([p for p in products if p.get('mas_vendido', False)]),
-            'categories': len(product_manager.get_categories()),
-            'brands': len(product_manager.get_brands()),
-            'price_range': {
-                'min': min([p.get('price_online', 0) for p in products if p.get('price_online')], default=0),
-                'max': max([p.get('price_online', 0) for p in products if p.get('price_online')], default=0)
-            }
-        }
+        stats = product_manager.get_stats()
         
-        return jsonify({
+        return api_response({
             'success': True,
             'data': stats
         })
     
     except Exception as e:
         logger.error(f"Error en API stats: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return api_response({'success': False, 'error': str(e)}, 500)
 
 # Interfaz web para probar productos
 @app.route('/admin/test')